@@ -1,6 +1,6 @@
 # Importing Libraries
-import copy
 import math
+import inspect
 import torch
 import numpy as np
 import pandas as pd
@@ -10,6 +10,8 @@ from utils.losses import ModifiedBCELoss
 from utils.text import CaptionProcessor
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Fused Adam is only available on newer PyTorch releases
+ADAM_SUPPORTS_FUSED = "fused" in inspect.signature(optim.Adam).parameters
 
 
 # Main class
@@ -32,6 +34,8 @@ class LIC:
         self.model_attacker_trained = False
         self.threshold = threshold
         self.device = device
+        self.generator = None
+        self.perm_buffer = None
 
         self.loss_functions = {
             "mse": torch.nn.MSELoss(),
@@ -72,75 +76,121 @@ class LIC:
         data: torch.tensor,
         pred: torch.tensor,
         normalized: bool = False,
-    ) -> torch.tensor:
-        self.train(data, feat, "D")
-        lambda_d = self.calcLambda(getattr(self, "attacker_D"), data, feat)
-        self.train(pred, feat, "M")
-        lambda_m = self.calcLambda(getattr(self, "attacker_M"), pred, feat)
-        print(f"{lambda_d=},\n{lambda_m=}")
+        data_lengths: torch.tensor = None,
+        pred_lengths: torch.tensor = None,
+        verbose: bool = True,
+        return_lambdas: bool = False,
+    ) -> Union[torch.tensor, tuple[torch.tensor, torch.tensor, torch.tensor]]:
+        self.train(data, feat, "D", data_lengths)
+        lambda_d = self.calcLambda(
+            getattr(self, "attacker_D"), data, feat, data_lengths
+        )
+        self.train(pred, feat, "M", pred_lengths)
+        lambda_m = self.calcLambda(
+            getattr(self, "attacker_M"), pred, feat, pred_lengths
+        )
+        if verbose:
+            print(f"{lambda_d=},\n{lambda_m=}")
         leakage_amp = lambda_m - lambda_d
         if normalized:
             leakage_amp = leakage_amp / (lambda_m + lambda_d)
+        if return_lambdas:
+            return leakage_amp, lambda_d, lambda_m
         return leakage_amp
 
-    def train(self, x, y, attacker_mode):
+    def train(self, x, y, attacker_mode, lengths=None):
         self.defineModel()
         model = getattr(self, "attacker_" + attacker_mode)
         criterion = self.loss_functions[self.train_params["loss_function"]]
+        device_type = torch.device(self.device).type
+        use_fused = ADAM_SUPPORTS_FUSED and device_type == "cuda"
         optimizer = optim.Adam(
-            model.parameters(), lr=self.train_params["learning_rate"]
+            model.parameters(),
+            lr=self.train_params["learning_rate"],
+            **({"fused": True} if use_fused else {"foreach": True}),
         )
         scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=10, gamma=0.1)
+        use_amp = self.train_params.get("amp", True) and device_type == "cuda"
+        scaler = torch.amp.GradScaler(device_type, enabled=use_amp)
 
         batches = math.ceil(len(x) / self.train_params["batch_size"])
         print(f"Training Activated for Mode: {attacker_mode}")
 
+        # One-time move; batches are then plain slices of device tensors
+        x = x.to(self.device, non_blocking=True).contiguous()
+        y = y.to(self.device, non_blocking=True).contiguous()
+        if lengths is not None:
+            # pack_padded_sequence needs lengths on the host, so they stay on CPU
+            lengths = lengths.cpu()
+
+        # Both attackers see the same number of captions, so one permutation
+        # buffer is shared by every train call across trials.
+        if (
+            self.perm_buffer is None
+            or self.perm_buffer.numel() != x.shape[0]
+            or self.perm_buffer.device != x.device
+        ):
+            self.perm_buffer = torch.empty(
+                x.shape[0], dtype=torch.long, device=x.device
+            )
+        perm = self.perm_buffer
         for epoch in range(1, self.train_params["epochs"] + 1):
-            perm = torch.randperm(x.shape[0], device=self.device)
-            x, y = x[perm], y[perm]
-            start, running_loss = 0, 0.0
-
-            for _ in range(batches):
-                x_batch = (
-                    x[start : start + self.train_params["batch_size"]]
-                    .to(self.device)
-                    .long()
-                )
-                y_batch = y[start : start + self.train_params["batch_size"]].to(
-                    self.device
+            # Shuffle indices only; gathering per batch avoids copying the dataset
+            torch.randperm(x.shape[0], out=perm, generator=self.generator)
+            running_loss = torch.zeros((), device=self.device)
+
+            idx_batches = torch.split(perm, self.train_params["batch_size"])
+            if lengths is None:
+                len_batches = [None] * len(idx_batches)
+            else:
+                # One host gather per epoch instead of a device sync per batch
+                len_batches = torch.split(
+                    lengths[perm.cpu()], self.train_params["batch_size"]
                 )
 
-                optimizer.zero_grad()
-                outputs = model(x_batch)
+            for idx, len_batch in zip(idx_batches, len_batches):
+                x_batch = x.index_select(0, idx)
+                y_batch = y.index_select(0, idx)
 
-                loss = criterion(outputs, y_batch)
-                loss.backward()
-                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+                with torch.autocast(
+                    device_type=device_type, dtype=torch.float16, enabled=use_amp
+                ):
+                    if len_batch is None:
+                        outputs = model(x_batch)
+                    else:
+                        outputs = model(x_batch, len_batch)
 
-                running_loss += loss.item()
-                start += self.train_params["batch_size"]
+                # BCELoss is not autocast-safe, so the loss is computed in FP32
+                loss = criterion(outputs.float(), y_batch)
+                scaler.scale(loss).backward()
+                scaler.step(optimizer)
+                scaler.update()
+
+                running_loss += loss.detach()
 
             scheduler.step()
 
             if epoch % 5 == 0:
-                print(f"Epoch {epoch}: Avg Loss = {running_loss / batches:.4f}")
+                print(f"Epoch {epoch}: Avg Loss = {running_loss.item() / batches:.4f}")
 
-    def calcLambda(self, model, x, y):
+    @torch.inference_mode()
+    def calcLambda(self, model, x, y, lengths=None):
         model.eval()
         batch_size = self.train_params.get("batch_size", 32)
 
-        y_pred_list = []
-        total_samples = x.shape[0]
-
-        with torch.no_grad():
-            for start in range(0, total_samples, batch_size):
-                end = min(start + batch_size, total_samples)
-                x_batch = x[start:end].to(self.device)
-                batch_pred = model(x_batch)
-                y_pred_list.append(batch_pred.cpu())
-        y_pred = torch.cat(y_pred_list, dim=0).to(self.device)
-        matches = (y_pred.argmax(axis=1) == y.argmax(axis=1)) * 1.0
-        vals = y_pred.max(dim=1).values * matches
+        # Predictions stay on device; x is already placed there by the caller
+        x_batches = torch.split(x, batch_size)
+        if lengths is None:
+            y_pred = torch.cat([model(x_batch) for x_batch in x_batches], dim=0)
+        else:
+            len_batches = torch.split(lengths.cpu(), batch_size)
+            y_pred = torch.cat(
+                [model(xb, lb) for xb, lb in zip(x_batches, len_batches)], dim=0
+            )
+        # A single max gives both the confidence and the predicted class
+        max_vals, pred_idx = y_pred.max(dim=1)
+        vals = torch.where(pred_idx == y.argmax(dim=1), max_vals, 0.0)
         return vals.mean()
 
     def defineModel(self):
@@ -148,7 +198,23 @@ class LIC:
         model_params = self.model_params["attacker_params"]
         model_params["vocab_size"] = self.vocab_size
         self.attacker_D = model_class(**model_params).to(self.device)
-        self.attacker_M = copy.deepcopy(self.attacker_D).to(self.device)
+        self.attacker_M = model_class(**model_params).to(self.device)
+        if self.train_params.get("compile", False):
+            self.attacker_D = self.compileModel(self.attacker_D)
+            self.attacker_M = self.compileModel(self.attacker_M)
+
+    @staticmethod
+    def compileModel(model):
+        """
+        Compile the attacker with torch.compile when it is available. Compilation
+        is lazy, so backend errors surface on the first forward call in train.
+        """
+        if not hasattr(torch, "compile"):
+            return model
+        # The default mode avoids CUDA graphs, whose reused output buffers would
+        # be overwritten while calcLambda collects per-batch predictions.
+        # dynamic=True avoids recompiling for the smaller final batch.
+        return torch.compile(model, dynamic=True)
 
     def captionPreprocess(
         self, model_captions, human_captions, similarity_thresh=1, mask_type="constant"
@@ -163,9 +229,20 @@ class LIC:
         )
         model_vocab = self.capProcessor.build_vocab(model_captions)
         human_vocab = self.capProcessor.build_vocab(human_captions)
-        self.vocab_size = max(len(model_vocab), len(human_vocab))
-        model_cap = self.capProcessor.tokens_to_numbers(model_vocab, model_captions)
-        human_cap = self.capProcessor.tokens_to_numbers(human_vocab, human_captions)
+        # Rounded up to a multiple of 64 for Tensor Core friendly embedding shapes;
+        # the extra rows are never indexed.
+        vocab_size = max(len(model_vocab), len(human_vocab))
+        self.vocab_size = ((vocab_size + 63) // 64) * 64
+        model_cap, model_lengths = self.capProcessor.tokens_to_numbers_fast(
+            model_vocab, model_captions, return_lengths=True
+        )
+        human_cap, human_lengths = self.capProcessor.tokens_to_numbers_fast(
+            human_vocab, human_captions, return_lengths=True
+        )
+        # Unpadded caption lengths for packed sequences; empty captions are
+        # treated as a single pad token since packing requires length >= 1.
+        self.model_cap_lengths = model_lengths.clamp(min=1)
+        self.human_cap_lengths = human_lengths.clamp(min=1)
         return model_cap, human_cap
 
     def getAmortizedLeakage(
@@ -183,11 +260,49 @@ class LIC:
         pred = pred.to(self.device)
         data = data.to(self.device)
         feat = feat.to(self.device)
-        vals = torch.zeros(num_trials)
-        for i in range(num_trials):
-            print(f"Working on Trial: {i}")
-            vals[i] = self.calcLeak(feat, data, pred, normalized).item()
-            print(f"Trial {i} val: {vals[i]}")
+        pred_lengths, data_lengths = None, None
+        if self.train_params.get("pack_sequences", False):
+            # Kept on CPU, where pack_padded_sequence consumes them
+            pred_lengths = self.model_cap_lengths
+            data_lengths = self.human_cap_lengths
+
+        # Per-trial seeds drawn from the global RNG keep trials reproducible
+        # under torch.manual_seed while shuffling on the training device.
+        self.generator = torch.Generator(device=self.device)
+        seeds = torch.randint(2**62, (num_trials,)).tolist()
+        # Columns: leakage, lambda_d, lambda_m
+        results = torch.zeros((num_trials, 3), device=self.device)
+        # Opt-in TF32 for the FP32 ANN matmuls, restored after the trials so
+        # other work in the process keeps its matmul precision.
+        matmul_precision = torch.get_float32_matmul_precision()
+        if self.train_params.get("tf32", False):
+            torch.set_float32_matmul_precision("high")
+        try:
+            # Trials run sequentially: the LSTM/RNN attackers have no
+            # torch.func.vmap batching rule, so they cannot be stacked into a
+            # single ensemble model.
+            for i in range(num_trials):
+                print(f"Working on Trial: {i}")
+                self.generator.manual_seed(seeds[i])
+                results[i, 0], results[i, 1], results[i, 2] = self.calcLeak(
+                    feat,
+                    data,
+                    pred,
+                    normalized,
+                    data_lengths=data_lengths,
+                    pred_lengths=pred_lengths,
+                    verbose=False,
+                    return_lambdas=True,
+                )
+        finally:
+            torch.set_float32_matmul_precision(matmul_precision)
+            # Standalone train/calcLeak calls shuffle with the global RNG again
+            self.generator = None
+        # Single device-to-host copy once all trials are done
+        results = results.cpu()
+        for i, (val, lambda_d, lambda_m) in enumerate(results.tolist()):
+            print(f"Trial {i}: {lambda_d=}, {lambda_m=}, val: {val}")
+        vals = results[:, 0]
         if method == "mean":
             return {
                 "Mean": torch.mean(vals),
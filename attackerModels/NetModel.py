@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import argparse
+from torch.nn.utils.rnn import pack_padded_sequence
 from attackerModels.ANN import simpleDenseModel
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -35,6 +36,7 @@ class LSTM_ANN_Model(nn.Module):
             batch_first=True,
             dropout=0.3,
         )
+        self.num_directions = 2 if lstm_bidirectional else 1
 
         self.ann = simpleDenseModel(
             input_dims=lstm_hidden_size * 2 if lstm_bidirectional else lstm_hidden_size,
@@ -47,7 +49,7 @@ class LSTM_ANN_Model(nn.Module):
         if ann_output_size > 1:
             self.lastAct = nn.Softmax()
 
-    def forward(self, x):
+    def forward(self, x, lengths=None):
 
         x = x.to(device)
 
@@ -58,8 +60,16 @@ class LSTM_ANN_Model(nn.Module):
         ), f"Expected input shape [batch_size, seq_len], but got {x.shape}"
 
         # LSTM
-        lstm_out, _ = self.lstm(x)
-        lstm_out = lstm_out[:, -1, :]  # Take the last hidden state
+        if lengths is not None:
+            # Skip padded timesteps and use the final hidden state of the last layer
+            packed = pack_padded_sequence(
+                x, lengths.cpu(), batch_first=True, enforce_sorted=False
+            )
+            _, (h_n, _) = self.lstm(packed)
+            lstm_out = torch.cat(list(h_n[-self.num_directions :]), dim=1)
+        else:
+            lstm_out, _ = self.lstm(x)
+            lstm_out = lstm_out[:, -1, :]  # Take the last hidden state
 
         # ANN
         ann_out = self.ann(lstm_out)
@@ -99,6 +109,7 @@ class RNN_ANN_Model(nn.Module):
             batch_first=True,
             dropout=0.3,
         )
+        self.num_directions = 2 if rnn_bidirectional else 1
 
         # ANN layer after RNN
         self.ann = simpleDenseModel(
@@ -113,7 +124,7 @@ class RNN_ANN_Model(nn.Module):
         if ann_output_size > 1:
             self.lastAct = nn.Softmax()
 
-    def forward(self, x):
+    def forward(self, x, lengths=None):
         x = x.to(device)
 
         # Embedding
@@ -123,8 +134,16 @@ class RNN_ANN_Model(nn.Module):
         ), f"Expected input shape [batch_size, seq_len], but got {x.shape}"
 
         # RNN
-        rnn_out, _ = self.rnn(x)
-        rnn_out = rnn_out[:, -1, :]  # Take the last hidden state
+        if lengths is not None:
+            # Skip padded timesteps and use the final hidden state of the last layer
+            packed = pack_padded_sequence(
+                x, lengths.cpu(), batch_first=True, enforce_sorted=False
+            )
+            _, h_n = self.rnn(packed)
+            rnn_out = torch.cat(list(h_n[-self.num_directions :]), dim=1)
+        else:
+            rnn_out, _ = self.rnn(x)
+            rnn_out = rnn_out[:, -1, :]  # Take the last hidden state
 
         # ANN
         ann_out = self.ann(rnn_out)
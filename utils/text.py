@@ -77,6 +77,37 @@ class CaptionProcessor:
             padding_value=pad_value,
         )
 
+    def tokens_to_numbers_fast(
+        self,
+        vocab,
+        text_obj: Union[list[str], pd.Series],
+        pad_value: int = 0,
+        return_lengths: bool = False,
+    ):
+        """
+        Vectorized equivalent of tokens_to_numbers: token ids are gathered into
+        a flat NumPy buffer and scattered into a preallocated padded int32 array.
+        With return_lengths, the unpadded caption lengths are returned as well.
+        """
+        stoi = vocab.get_stoi()
+        token_lists = self.apply_tokenizer(text_obj)
+        lengths = np.fromiter(
+            (len(tokens) for tokens in token_lists),
+            dtype=np.int64,
+            count=len(token_lists),
+        )
+        flat_ids = np.fromiter(
+            (stoi[token] for tokens in token_lists for token in tokens),
+            dtype=np.int32,
+            count=int(lengths.sum()),
+        )
+        max_len = int(lengths.max()) if len(lengths) else 0
+        token_ids = np.full((len(lengths), max_len), pad_value, dtype=np.int32)
+        token_ids[np.arange(max_len) < lengths[:, None]] = flat_ids
+        if return_lengths:
+            return torch.from_numpy(token_ids), torch.from_numpy(lengths)
+        return torch.from_numpy(token_ids)
+
     def maskWords(
         self,
         string_list: Union[list[str], pd.Series],